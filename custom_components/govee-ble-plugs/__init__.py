@@ -1,5 +1,7 @@
 from __future__ import annotations
 
+from typing import TYPE_CHECKING
+
 from homeassistant.components import bluetooth
 from homeassistant.config_entries import ConfigEntry
 from homeassistant.const import CONF_ACCESS_TOKEN, CONF_ADDRESS, CONF_MODEL, Platform
@@ -8,8 +10,10 @@ from homeassistant.exceptions import ConfigEntryNotReady
 
 from .const import DOMAIN
 from .coordinator import GoveePlugDataUpdateCoordinator
+from .plugs import get_api_by_model
 
-from .plugs import GoveePlugApi, get_api_by_model
+if TYPE_CHECKING:
+    from .plugs import GoveePlugApi
 
 PLATFORMS: list[str] = [Platform.SWITCH]
 
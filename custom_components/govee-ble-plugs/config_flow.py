@@ -1,9 +1,8 @@
 from __future__ import annotations
 
 import logging
-from typing import Any
+from typing import TYPE_CHECKING, Any
 
-from bleak.backends.device import BLEDevice
 import voluptuous as vol
 
 from homeassistant.components.bluetooth import (
@@ -18,9 +17,13 @@ from .plugs import (
     parse_advertisement_data,
     GoveeAdvertisementData,
     get_pair_by_model,
-    GoveePairApi,
 )
 
+if TYPE_CHECKING:
+    from bleak.backends.device import BLEDevice
+
+    from .plugs import GoveePairApi
+
 _LOGGER: logging.Logger = logging.getLogger(__package__)
 
 
@@ -33,6 +36,7 @@ class GoveeBlePlugsConfigFlow(ConfigFlow, domain=DOMAIN):
         self._errors: dict[str, str] = {}
         self._discovered_adv: GoveeAdvertisementData | None = None
         self._discovered_advs: dict[str, GoveeAdvertisementData] = {}
+        self._rejected_addresses: set[str] = set()
         self._ble_device: BLEDevice | None = None
         self._name: str | None = None
         self._bdaddr: str | None = None
@@ -71,7 +75,11 @@ class GoveeBlePlugsConfigFlow(ConfigFlow, domain=DOMAIN):
             for discovery_info in async_discovered_service_info(self.hass):
                 self._ble_device = discovery_info.device
                 address = discovery_info.address
-                if address in current_addresses or address in self._discovered_advs:
+                if (
+                    address in current_addresses
+                    or address in self._discovered_advs
+                    or address in self._rejected_addresses
+                ):
                     continue
                 parsed = parse_advertisement_data(
                     discovery_info.device, discovery_info.advertisement
@@ -79,6 +87,8 @@ class GoveeBlePlugsConfigFlow(ConfigFlow, domain=DOMAIN):
                 if parsed:
                     self._discovered_adv = parsed
                     self._discovered_advs[address] = parsed
+                else:
+                    self._rejected_addresses.add(address)
 
         if not self._discovered_advs:
             return self.async_abort(reason="no_devices_found")
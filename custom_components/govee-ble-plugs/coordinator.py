@@ -11,11 +11,11 @@ from homeassistant.components.bluetooth.passive_update_coordinator import (
 from homeassistant.const import Platform
 from homeassistant.core import HomeAssistant, callback
 
-from .plugs import GoveePlugApi
-
 if TYPE_CHECKING:
     from bleak.backends.device import BLEDevice
 
+    from .plugs import GoveePlugApi
+
 _LOGGER: logging.Logger = logging.getLogger(__package__)
 PLATFORMS: list[str] = [Platform.SWITCH]
 
@@ -46,5 +46,15 @@ class GoveePlugDataUpdateCoordinator(PassiveBluetoothDataUpdateCoordinator):
         change: bluetooth.BluetoothChange,
     ) -> None:
         """Handle a Bluetooth event."""
-        self.api.handle_bluetooth_event(service_info.device, service_info.advertisement)
+        changed = self.api.handle_bluetooth_event(
+            service_info.device, service_info.advertisement
+        )
+
+        # Plugs repeat the same advertisement several times a second, only
+        # notify listeners when the state changed or the plug came back.
+        # With no listeners there is nobody to notify either; the api has
+        # already recorded the new state.
+        if self.available and (not changed or not self._listeners):
+            return
+
         super()._async_handle_bluetooth_event(service_info, change)
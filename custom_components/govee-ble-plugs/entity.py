@@ -5,11 +5,8 @@ from typing import Any, Optional
 from homeassistant.components.bluetooth.passive_update_coordinator import (
     PassiveBluetoothCoordinatorEntity,
 )
-from homeassistant.config_entries import ConfigEntry
-from homeassistant.helpers import device_registry as dr
 from homeassistant.helpers.device_registry import DeviceInfo
 
-from .const import MANUFACTURER
 from .coordinator import GoveePlugDataUpdateCoordinator
 
 
@@ -23,9 +20,8 @@ class GoveePlugEntity(
     def __init__(
         self,
         coordinator,
-        config_entry: ConfigEntry,
+        device_info: DeviceInfo,
         port: Optional[int],
-        port_name: Optional[str],
     ):
         """Initialise the entity."""
         super().__init__(coordinator)
@@ -37,10 +33,6 @@ class GoveePlugEntity(
             self._attr_unique_id = self._address
         else:
             self._attr_unique_id = f"{self._address}-{port}"
-        self._attr_name = port_name
-        self._attr_device_info = DeviceInfo(
-            connections={(dr.CONNECTION_BLUETOOTH, self._address)},
-            manufacturer=MANUFACTURER,
-            model=self.coordinator.api.MODEL,
-            name=config_entry.title,
-        )
+        api = self.coordinator.api
+        self._attr_name = api.PORT_NAMES[api.PORTS.index(port)]
+        self._attr_device_info = device_info
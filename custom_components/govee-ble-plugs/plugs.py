@@ -1,95 +1,99 @@
+from __future__ import annotations
+
 import asyncio
+import collections
 import dataclasses
+import functools
 import logging
-import queue
+import operator
 import typing as T
 
-from bleak import BleakClient
-from bleak.backends.device import BLEDevice
-from bleak.backends.scanner import AdvertisementData
-from bleak_retry_connector import establish_connection
-
 from homeassistant.exceptions import ConfigEntryError
 
-_LOGGER: logging.Logger = logging.getLogger(__package__)
-
+if T.TYPE_CHECKING:
+    from bleak import BleakClient
+    from bleak.backends.device import BLEDevice
+    from bleak.backends.scanner import AdvertisementData
 
-def _b(s: str):
-    return bytes(bytearray.fromhex(s))
+    # Only used for type checking, the plug classes implement these
+    # structurally and don't inherit from them
+    class GoveePlugApi(T.Protocol):
+        MODEL: T.Final[str]
 
+        # parallel tuples: port number (None for the original H5080 entity)
+        # and the name of the entity for that port
+        PORTS: T.Final[T.Tuple[T.Optional[int], ...]]
+        PORT_NAMES: T.Final[T.Tuple[T.Optional[str], ...]]
 
-def _sign_payload(data):
-    checksum = 0
-    for b in data:
-        checksum ^= b
-    return checksum & 0xFF
+        def __init__(self, device: BLEDevice, token: str) -> None: ...
 
+        def is_on(self, port: int) -> bool | None: ...
 
-class GoveePlugApi(T.Protocol):
-    MODEL: T.Final[str]
+        def handle_bluetooth_event(
+            self, device: BLEDevice, adv: AdvertisementData
+        ) -> bool:
+            """Returns True if the state changed"""
+            ...
 
-    def __init__(self, device: BLEDevice, token: str) -> None: ...
+        async def async_turn_on(self, port: int): ...
 
-    def port_names(self) -> T.List[T.Tuple[T.Optional[int], T.Optional[str]]]: ...
+        async def async_turn_off(self, port: int): ...
 
-    def is_on(self, port: int) -> bool | None: ...
+    class GoveePairApi(T.Protocol):
 
-    def handle_bluetooth_event(self, device: BLEDevice, adv: AdvertisementData): ...
+        async def begin(self): ...
 
-    async def async_turn_on(self, port: int): ...
+        async def finish(self) -> str | None: ...
 
-    async def async_turn_off(self, port: int): ...
 
+_LOGGER: logging.Logger = logging.getLogger(__package__)
 
-class GoveePairApi(T.Protocol):
+# How long to wait for more commands (such as other ports of the same plug
+# being toggled by a script) before connecting and sending them together
+_BATCH_DELAY = 0.05
 
-    async def begin(self): ...
+# How long to wait for the plug to acknowledge a message. If an ack is lost
+# the connection is dropped so that the remaining messages get a new one.
+_ACK_TIMEOUT = 5
 
-    async def finish(self) -> str | None: ...
 
+async def _connect(device: BLEDevice) -> BleakClient:
+    # bleak is only needed once we actually talk to a plug, so don't pay
+    # for importing it when the integration loads
+    from bleak import BleakClient
+    from bleak_retry_connector import establish_connection
 
-def get_api_by_model(model: str, device: BLEDevice, token: str) -> GoveePlugApi:
-    if model == "H5080":
-        return GoveePlugH5080(device, token)
+    return await establish_connection(
+        BleakClient, device, f"{device.name} ({device.address})"
+    )
 
-    if model == "H5082":
-        return GoveePlugH5082(device, token)
 
-    if model == "H5086":
-        return GoveePlugH5086(device, token)
+def _sign_payload(data: bytes) -> int:
+    return functools.reduce(operator.xor, data, 0) & 0xFF
 
-    raise ConfigEntryError(f"Unsupported model {model}")
 
+def _get_model_class(model: str) -> T.Type["GoveePlugH508x"]:
+    cls = _MODELS.get(model)
+    if cls is None:
+        raise ConfigEntryError(f"Unsupported model {model}")
+    return cls
 
-def get_pair_by_model(model: str, device: BLEDevice) -> GoveePairApi:
-    if model == "H5080":
-        return GoveePlugPairer(
-            device,
-            GoveePlugH5080.RECV_CHARACTERISTIC_UUID,
-            GoveePlugH5080.SEND_CHARACTERISTIC_UUID,
-            GoveePlugH5080.MSG_GET_AUTH_KEY,
-        )
 
-    if model == "H5082":
-        return GoveePlugPairer(
-            device,
-            GoveePlugH5082.RECV_CHARACTERISTIC_UUID,
-            GoveePlugH5082.SEND_CHARACTERISTIC_UUID,
-            GoveePlugH5082.MSG_GET_AUTH_KEY,
-        )
+def get_api_by_model(model: str, device: BLEDevice, token: str) -> GoveePlugApi:
+    return _get_model_class(model)(device, token)
 
-    if model == "H5086":
-        return GoveePlugPairer(
-            device,
-            GoveePlugH5086.RECV_CHARACTERISTIC_UUID,
-            GoveePlugH5086.SEND_CHARACTERISTIC_UUID,
-            GoveePlugH5086.MSG_GET_AUTH_KEY,
-        )
 
-    raise ConfigEntryError(f"Unsupported model {model}")
+def get_pair_by_model(model: str, device: BLEDevice) -> GoveePairApi:
+    cls = _get_model_class(model)
+    return GoveePlugPairer(
+        device,
+        cls.RECV_CHARACTERISTIC_UUID,
+        cls.SEND_CHARACTERISTIC_UUID,
+        cls.MSG_GET_AUTH_KEY,
+    )
 
 
-@dataclasses.dataclass
+@dataclasses.dataclass(slots=True, frozen=True)
 class GoveeAdvertisementData:
     name: str
     address: str
@@ -97,6 +101,14 @@ class GoveeAdvertisementData:
     model: str
 
 
+# local name prefix -> model
+_MODEL_BY_PREFIX: T.Final[T.Dict[str, str]] = {
+    "ihoment_H5080_": "H5080",
+    "ihoment_H5082_": "H5082",
+    "GVH5086": "H5086",
+}
+
+
 def parse_advertisement_data(
     device: BLEDevice, adv: AdvertisementData
 ) -> GoveeAdvertisementData | None:
@@ -104,23 +116,21 @@ def parse_advertisement_data(
     if not local_name:
         return
 
-    if local_name.startswith("ihoment_H5080_"):
-        return GoveeAdvertisementData(
-            local_name, device.address, device, GoveePlugH5080.MODEL
-        )
+    for prefix, model in _MODEL_BY_PREFIX.items():
+        if local_name.startswith(prefix):
+            return GoveeAdvertisementData(local_name, device.address, device, model)
 
-    if local_name.startswith("ihoment_H5082_"):
-        return GoveeAdvertisementData(
-            local_name, device.address, device, GoveePlugH5082.MODEL
-        )
 
-    if local_name.startswith("GVH5086"):
-        return GoveeAdvertisementData(
-            local_name, device.address, device, GoveePlugH5086.MODEL
-        )
+class GoveePlugH508x:
+    MODEL: T.ClassVar[str]
 
+    PORTS: T.ClassVar[T.Tuple[T.Optional[int], ...]]
+    PORT_NAMES: T.ClassVar[T.Tuple[T.Optional[str], ...]]
 
-class GoveePlugH508x:
+    MSG_GET_AUTH_KEY: T.ClassVar[bytes]
+
+    SEND_CHARACTERISTIC_UUID: T.ClassVar[str]
+    RECV_CHARACTERISTIC_UUID: T.ClassVar[str]
 
     def __init__(
         self,
@@ -130,16 +140,20 @@ class GoveePlugH508x:
         SEND_CHARACTERISTIC_UUID: str,
     ) -> None:
         self._device = device
-        self._token = token
         self._RECV_CHARACTERISTIC_UUID = RECV_CHARACTERISTIC_UUID
         self._SEND_CHARACTERISTIC_UUID = SEND_CHARACTERISTIC_UUID
 
+        # The token never changes for a given entry, so build the signed
+        # authentication frame once instead of on every connection
+        body = b"\x33\xb2" + bytes.fromhex(token).ljust(17, b"\0")
+        self._auth_frame = body + bytes((_sign_payload(body),))
+
         self._connection_task: T.Optional[asyncio.Task] = None
-        self._msgqueue = asyncio.Queue[T.Tuple[bytes, asyncio.Future[bool]]]()
+        self._msgqueue = asyncio.Queue[T.Tuple[int, bytes, asyncio.Future[bool]]]()
 
-    async def _send_message(self, msg: bytes) -> bool:
+    async def _send_message(self, port: int, msg: bytes) -> bool:
         f = asyncio.Future[bool]()
-        self._msgqueue.put_nowait((msg, f))
+        self._msgqueue.put_nowait((port, msg, f))
         self._ensure_message_task()
         return await f
 
@@ -163,68 +177,103 @@ class GoveePlugH508x:
 
     async def _message_task_fn(self):
         client = None
-        must_process = queue.Queue[T.Tuple[bytes, asyncio.Future]]()
+        must_process = collections.deque[T.Tuple[int, bytes, asyncio.Future]]()
 
         try:
+            await asyncio.sleep(_BATCH_DELAY)
+
             # Pull anything on the message queue directly off, these must
             # be processed one way or another
             while not self._msgqueue.empty():
-                must_process.put(self._msgqueue.get_nowait())
+                must_process.append(self._msgqueue.get_nowait())
+
+            # Only the last message queued for each port matters, so anything
+            # it supersedes is not sent
+            latest = {port: f for port, _, f in must_process}
+            for port, _, f in must_process:
+                if f is not latest[port] and not f.done():
+                    f.set_result(False)
 
-            client = await establish_connection(
-                BleakClient,
-                self._device,
-                f"{self._device.name} ({self._device.address})",
+            must_process = collections.deque(
+                item for item in must_process if item[2] is latest[item[0]]
             )
 
-            # events to control execution flow
+            client = await _connect(self._device)
+
+            # events to control execution flow. Each message gets its own
+            # future so that an earlier ack can't satisfy a later message
+            loop = asyncio.get_running_loop()
             on_auth_ready = asyncio.Event()
-            on_set_state_ready = asyncio.Event()
+            on_set_state_ready: T.Optional[asyncio.Future[None]] = None
 
             async def recv_handler(c, data):
                 if data[0] == 0x33 and data[1] == 0xB2:
                     on_auth_ready.set()
                 elif data[0] == 0x33 and data[1] == 0x01:
-                    on_set_state_ready.set()
-
-            await client.start_notify(self._RECV_CHARACTERISTIC_UUID, recv_handler)
+                    if on_set_state_ready and not on_set_state_ready.done():
+                        on_set_state_ready.set_result(None)
+
+            # Resolve the characteristics once instead of looking them up by
+            # UUID on every call. If one is missing, pass the UUID on and let
+            # bleak report the error.
+            services = client.services
+            send_char = services.get_characteristic(self._SEND_CHARACTERISTIC_UUID)
+            recv_char = services.get_characteristic(self._RECV_CHARACTERISTIC_UUID)
+            if recv_char is None:
+                recv_char = self._RECV_CHARACTERISTIC_UUID
+
+            await client.start_notify(recv_char, recv_handler)
+
+            # State messages are acknowledged with a notification, so skip
+            # waiting for the ATT write response when the plug allows it
+            if send_char is None:
+                send_char = self._SEND_CHARACTERISTIC_UUID
+                state_response = True
+            else:
+                state_response = "write-without-response" not in send_char.properties
 
-            ba = bytearray([0x33, 0xB2]) + bytearray.fromhex(self._token).ljust(
-                17, b"\0"
-            )
-            ba.append(_sign_payload(ba))
-            await client.write_gatt_char(self._SEND_CHARACTERISTIC_UUID, ba)
-            await on_auth_ready.wait()
+            await client.write_gatt_char(send_char, self._auth_frame, response=True)
+            async with asyncio.timeout(_ACK_TIMEOUT):
+                await on_auth_ready.wait()
 
             #
             # Send messages after authentication occurs
             #
 
             async def _send_msg(msg: bytes, f: asyncio.Future):
+                nonlocal on_set_state_ready
+                on_set_state_ready = loop.create_future()
                 try:
-                    await client.write_gatt_char(self._SEND_CHARACTERISTIC_UUID, msg)
-                    await on_set_state_ready.wait()
+                    await client.write_gatt_char(
+                        send_char, msg, response=state_response
+                    )
+                    async with asyncio.timeout(_ACK_TIMEOUT):
+                        await on_set_state_ready
                 except Exception:
-                    f.set_result(False)
+                    if not f.done():
+                        f.set_result(False)
                     raise
                 else:
-                    f.set_result(True)
+                    # the caller may have been cancelled while waiting
+                    if not f.done():
+                        f.set_result(True)
 
             # Process must process entries first
-            while not must_process.empty():
-                msg, f = must_process.get_nowait()
+            while must_process:
+                _, msg, f = must_process.popleft()
                 await _send_msg(msg, f)
 
             # Then process anything else that might be in the queue
             while True:
                 try:
-                    msg, f = await asyncio.wait_for(self._msgqueue.get(), timeout=1)
+                    async with asyncio.timeout(1):
+                        _, msg, f = await self._msgqueue.get()
                 except TimeoutError:
                     break
                 else:
                     await _send_msg(msg, f)
 
-            await client.stop_notify(self._RECV_CHARACTERISTIC_UUID)
+            await client.stop_notify(recv_char)
 
         except Exception as e:
             _LOGGER.error("failed to set state: %s", e)
@@ -232,9 +281,10 @@ class GoveePlugH508x:
             # We only force clearing the must process queue. Anything that
             # was queued while the connection was failing deserves another try
             # and will be requeued when this task's done callback is called
-            while not must_process.empty():
-                _, f = must_process.get_nowait()
-                f.set_result(False)
+            while must_process:
+                _, _, f = must_process.popleft()
+                if not f.done():
+                    f.set_result(False)
 
             if client is not None:
                 await client.disconnect()
@@ -243,9 +293,12 @@ class GoveePlugH508x:
 class GoveePlugH5080(GoveePlugH508x):
     MODEL = "H5080"
 
-    MSG_GET_AUTH_KEY = _b("aab100000000000000000000000000000000001b")
-    MSG_TURN_ON = _b("3301ff00000000000000000000000000000000cd")
-    MSG_TURN_OFF = _b("3301f000000000000000000000000000000000c2")
+    PORTS = (None,)
+    PORT_NAMES = (None,)
+
+    MSG_GET_AUTH_KEY = bytes.fromhex("aab100000000000000000000000000000000001b")
+    MSG_TURN_ON = bytes.fromhex("3301ff00000000000000000000000000000000cd")
+    MSG_TURN_OFF = bytes.fromhex("3301f000000000000000000000000000000000c2")
 
     SEND_CHARACTERISTIC_UUID = "00010203-0405-0607-0809-0a0b0c0d2b11"
     RECV_CHARACTERISTIC_UUID = "00010203-0405-0607-0809-0a0b0c0d2b10"
@@ -256,37 +309,45 @@ class GoveePlugH5080(GoveePlugH508x):
         )
         self._is_on = None
 
-    def port_names(self) -> T.List[T.Tuple[T.Optional[int], T.Optional[str]]]:
-        return [(None, None)]
-
     def is_on(self, port: int):
         return self._is_on
 
     def handle_bluetooth_event(self, device: BLEDevice, adv: AdvertisementData):
-        for _, mfr_data in adv.manufacturer_data.items():
-            self._device = device
-            self._is_on = mfr_data[-1] == 0x01
+        mfr_data = next(iter(adv.manufacturer_data.values()), None)
+        if mfr_data is None:
+            return False
+
+        self._device = device
+        is_on = mfr_data[-1] == 0x01
+        if is_on == self._is_on:
+            return False
+
+        self._is_on = is_on
+        return True
 
     async def async_turn_on(self, port: int):
         assert port == 0
-        if await self._send_message(self.MSG_TURN_ON):
+        if await self._send_message(port, self.MSG_TURN_ON):
             self._is_on = True
 
     async def async_turn_off(self, port: int):
         assert port == 0
-        if await self._send_message(self.MSG_TURN_OFF):
+        if await self._send_message(port, self.MSG_TURN_OFF):
             self._is_on = False
 
 
 class GoveePlugH5082(GoveePlugH508x):
     MODEL = "H5082"
 
-    MSG_GET_AUTH_KEY = _b("aab100000000000000000000000000000000001b")
+    PORTS = (0, 1)
+    PORT_NAMES = ("Left Power", "Right Power")
 
-    MSG_LEFT_ON = _b("3301220000000000000000000000000000000010")
-    MSG_LEFT_OFF = _b("3301200000000000000000000000000000000012")
-    MSG_RIGHT_ON = _b("3301110000000000000000000000000000000023")
-    MSG_RIGHT_OFF = _b("3301100000000000000000000000000000000022")
+    MSG_GET_AUTH_KEY = bytes.fromhex("aab100000000000000000000000000000000001b")
+
+    MSG_LEFT_ON = bytes.fromhex("3301220000000000000000000000000000000010")
+    MSG_LEFT_OFF = bytes.fromhex("3301200000000000000000000000000000000012")
+    MSG_RIGHT_ON = bytes.fromhex("3301110000000000000000000000000000000023")
+    MSG_RIGHT_OFF = bytes.fromhex("3301100000000000000000000000000000000022")
 
     SEND_CHARACTERISTIC_UUID = "00010203-0405-0607-0809-0a0b0c0d2b11"
     RECV_CHARACTERISTIC_UUID = "00010203-0405-0607-0809-0a0b0c0d2b10"
@@ -297,17 +358,21 @@ class GoveePlugH5082(GoveePlugH508x):
         )
         self._is_on: T.List[T.Optional[bool]] = [None, None]
 
-    def port_names(self) -> T.List[T.Tuple[T.Optional[int], T.Optional[str]]]:
-        return [(0, "Left Power"), (1, "Right Power")]
-
     def is_on(self, port: int):
         return self._is_on[port]
 
     def handle_bluetooth_event(self, device: BLEDevice, adv: AdvertisementData):
-        for _, mfr_data in adv.manufacturer_data.items():
-            self._device = device
-            self._is_on[0] = (mfr_data[-1] & 0x2) == 0x2
-            self._is_on[1] = (mfr_data[-1] & 0x1) == 0x1
+        mfr_data = next(iter(adv.manufacturer_data.values()), None)
+        if mfr_data is None:
+            return False
+
+        self._device = device
+        is_on = [(mfr_data[-1] & 0x2) == 0x2, (mfr_data[-1] & 0x1) == 0x1]
+        if is_on == self._is_on:
+            return False
+
+        self._is_on = is_on
+        return True
 
     async def async_turn_on(self, port: int):
         if port == 0:
@@ -317,7 +382,7 @@ class GoveePlugH5082(GoveePlugH508x):
         else:
             assert False
 
-        if await self._send_message(msg):
+        if await self._send_message(port, msg):
             self._is_on[port] = True
 
     async def async_turn_off(self, port: int):
@@ -328,46 +393,21 @@ class GoveePlugH5082(GoveePlugH508x):
         else:
             assert False
 
-        if await self._send_message(msg):
+        if await self._send_message(port, msg):
             self._is_on[port] = False
 
 
-class GoveePlugH5086(GoveePlugH508x):
+class GoveePlugH5086(GoveePlugH5080):
+    # Single outlet like the H5080, only the on/off messages differ
     MODEL = "H5086"
 
-    MSG_GET_AUTH_KEY = _b("aab100000000000000000000000000000000001b")
-    MSG_TURN_ON = _b("3301010000000000000000000000000000000033")
-    MSG_TURN_OFF = _b("3301000000000000000000000000000000000032")
+    MSG_TURN_ON = bytes.fromhex("3301010000000000000000000000000000000033")
+    MSG_TURN_OFF = bytes.fromhex("3301000000000000000000000000000000000032")
 
-    SEND_CHARACTERISTIC_UUID = "00010203-0405-0607-0809-0a0b0c0d2b11"
-    RECV_CHARACTERISTIC_UUID = "00010203-0405-0607-0809-0a0b0c0d2b10"
 
-    def __init__(self, device: BLEDevice, token: str) -> None:
-        super().__init__(
-            device, token, self.RECV_CHARACTERISTIC_UUID, self.SEND_CHARACTERISTIC_UUID
-        )
-        self._is_on = None
-
-    def port_names(self) -> T.List[T.Tuple[T.Optional[int], T.Optional[str]]]:
-        return [(None, None)]
-
-    def is_on(self, port: int):
-        return self._is_on
-
-    def handle_bluetooth_event(self, device: BLEDevice, adv: AdvertisementData):
-        for _, mfr_data in adv.manufacturer_data.items():
-            self._device = device
-            self._is_on = mfr_data[-1] == 0x01
-
-    async def async_turn_on(self, port: int):
-        assert port == 0
-        if await self._send_message(self.MSG_TURN_ON):
-            self._is_on = True
-
-    async def async_turn_off(self, port: int):
-        assert port == 0
-        if await self._send_message(self.MSG_TURN_OFF):
-            self._is_on = False
+_MODELS: T.Final[T.Dict[str, T.Type[GoveePlugH508x]]] = {
+    cls.MODEL: cls for cls in (GoveePlugH5080, GoveePlugH5082, GoveePlugH5086)
+}
 
 
 class GoveePlugPairer:
@@ -385,11 +425,7 @@ class GoveePlugPairer:
 
     async def begin(self):
         _LOGGER.info(f"%s: connecting to begin pairing", self._device.name)
-        self._client = await establish_connection(
-            BleakClient,
-            self._device,
-            f"{self._device.name} ({self._device.address})",
-        )
+        self._client = await _connect(self._device)
 
         await self._client.start_notify(self._recv_uuid, self._recv_handler)
         await self._send_get_auth_key()
@@ -1,15 +1,18 @@
 from __future__ import annotations
 
+from collections.abc import Awaitable, Callable
 from typing import Any
 
 from homeassistant.components.switch import SwitchEntity, SwitchDeviceClass
 from homeassistant.config_entries import ConfigEntry
-from homeassistant.core import HomeAssistant
+from homeassistant.core import HomeAssistant, callback
+from homeassistant.helpers import device_registry as dr
+from homeassistant.helpers.device_registry import DeviceInfo
 from homeassistant.helpers.entity_platform import (
     AddEntitiesCallback,
 )
 
-from .const import DOMAIN
+from .const import DOMAIN, MANUFACTURER
 from .coordinator import GoveePlugDataUpdateCoordinator
 from .entity import GoveePlugEntity
 
@@ -18,11 +21,24 @@ async def async_setup_entry(
     hass: HomeAssistant, entry: ConfigEntry, async_add_entities: AddEntitiesCallback
 ) -> None:
     """Set up govee plug based on a config entry."""
-    coordinator: GoveePlugDataUpdateCoordinator = hass.data[DOMAIN][entry.entry_id]
-    entities = []
-    for port, port_name in coordinator.api.port_names():
-        entities.append(GoveePlugSwitch(coordinator, entry, port, port_name))
-    async_add_entities(entities)
+    # every platform shares the entry's coordinator, so a single stream of
+    # advertisements feeds all of the plug's entities
+    coordinator = hass.data[DOMAIN][entry.entry_id]
+    assert isinstance(coordinator, GoveePlugDataUpdateCoordinator)
+    api = coordinator.api
+    # every port belongs to the same device, so they can share its info
+    device_info = DeviceInfo(
+        connections={(dr.CONNECTION_BLUETOOTH, coordinator.ble_device.address)},
+        manufacturer=MANUFACTURER,
+        model=api.MODEL,
+        name=entry.title,
+    )
+    # state comes from advertisements the coordinator has already seen, there
+    # is nothing to fetch from the plug before adding
+    async_add_entities(
+        (GoveePlugSwitch(coordinator, device_info, port) for port in api.PORTS),
+        update_before_add=False,
+    )
 
 
 class GoveePlugSwitch(GoveePlugEntity, SwitchEntity):
@@ -31,17 +47,63 @@ class GoveePlugSwitch(GoveePlugEntity, SwitchEntity):
     _attr_device_class = SwitchDeviceClass.OUTLET
     _attr_translation_key = "power"
 
+    _written_available: bool | None = None
+    _commands_in_flight = 0
+
+    async def async_added_to_hass(self) -> None:
+        """Read the initial state when added."""
+        self._attr_is_on = self.coordinator.api.is_on(self._port)
+        await super().async_added_to_hass()
+
+    @callback
+    def _handle_coordinator_update(self) -> None:
+        """Write the state only if this port or its availability changed."""
+        is_on = self.coordinator.api.is_on(self._port)
+        available = self.available
+        # other ports of the same plug notify the coordinator too
+        if is_on == self._attr_is_on and available == self._written_available:
+            return
+
+        self._attr_is_on = is_on
+        self._written_available = available
+        self.async_write_ha_state()
+
     async def async_turn_on(self, **kwargs: Any) -> None:
         """Turn on the switch."""
-        await self.coordinator.api.async_turn_on(self._port)
-        self.async_write_ha_state()
+        if self._matches_state(True):
+            return
+        await self._async_send_command(self.coordinator.api.async_turn_on)
 
     async def async_turn_off(self, **kwargs: Any) -> None:
         """Turn off the switch."""
-        await self.coordinator.api.async_turn_off(self._port)
-        self.async_write_ha_state()
+        if self._matches_state(False):
+            return
+        await self._async_send_command(self.coordinator.api.async_turn_off)
+
+    def _matches_state(self, is_on: bool) -> bool:
+        # the plug advertises its state constantly, so it can be trusted to
+        # skip a connection that wouldn't change anything. A command that is
+        # still queued or running may change it though, so never skip then.
+        return (
+            not self._commands_in_flight
+            and self.coordinator.api.is_on(self._port) is is_on
+        )
+
+    async def _async_send_command(
+        self, command: Callable[[int], Awaitable[None]]
+    ) -> None:
+        self._commands_in_flight += 1
+        try:
+            await command(self._port)
+        finally:
+            self._commands_in_flight -= 1
+        self._async_update_from_command()
 
-    @property
-    def is_on(self) -> bool | None:
-        """Return true if the switch is on."""
-        return self.coordinator.api.is_on(self._port)
+    @callback
+    def _async_update_from_command(self) -> None:
+        # the coordinator isn't notified of commands, but there's nothing to
+        # write if the command failed or was superseded
+        is_on = self.coordinator.api.is_on(self._port)
+        if is_on != self._attr_is_on:
+            self._attr_is_on = is_on
+            self.async_write_ha_state()